@@ -2,12 +2,25 @@ import socket
 import ssl
 import os
 import time
-from typing import Optional, Tuple
+import weakref
+from typing import Dict, Optional, Tuple
 
 
 class FileTransferClient:
     """Cliente para transferência de arquivos com suporte a TCP e TLS"""
     
+    # Contexto TLS compartilhado entre clientes (permite retomada de sessão)
+    _shared_tls_ctx: Optional[ssl.SSLContext] = None
+    # Última sessão TLS por contexto e destino (host, porta): uma sessão só
+    # pode ser retomada com o mesmo SSLContext que a criou
+    _tls_sessions: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+    # Tamanho dos blocos lidos do arquivo para envio
+    CHUNK_SIZE = 64 * 1024
+    # Confirmação enviada pelo servidor após cada arquivo
+    ACK = b"ACK: Arquivo recebido com sucesso!"
+    # Buffers de envio/recepção do socket (>= arquivo de teste)
+    SOCKET_BUFFER_SIZE = 1024 * 1024
+    
     def __init__(self, host: str = 'localhost', port: int = 5000):
         self.host = host
         self.port = port
@@ -17,10 +30,30 @@ class FileTransferClient:
             'transfer_time': 0.0,
             'packet_overhead': 0
         }
+        # Buffer de envio reutilizado por todas as transferências do cliente
+        self._scratch = bytearray(self.CHUNK_SIZE)
     
     def _create_socket(self) -> socket.socket:
         """Cria um socket TCP"""
-        return socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        # Desativa Nagle e fixa os buffers para medições determinísticas
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.SOCKET_BUFFER_SIZE)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.SOCKET_BUFFER_SIZE)
+        return sock
+    
+    @classmethod
+    def get_tls_context(cls) -> ssl.SSLContext:
+        """Retorna o contexto SSL/TLS compartilhado, criando-o na primeira chamada"""
+        if cls._shared_tls_ctx is None:
+            context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+            
+            # Para ambiente de desenvolvimento (aceita certificados auto-assinados)
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+            
+            cls._shared_tls_ctx = context
+        return cls._shared_tls_ctx
     
     def connect_plain(self) -> bool:
         """Estabelece conexão TCP sem criptografia"""
@@ -34,23 +67,22 @@ class FileTransferClient:
             print(f"[ERRO] Falha na conexão TCP: {e}")
             return False
     
-    def connect_tls(self, certfile: Optional[str] = None) -> bool:
+    def connect_tls(self, certfile: Optional[str] = None,
+                    context: Optional[ssl.SSLContext] = None) -> bool:
         """Estabelece conexão TCP com TLS"""
         try:
             # Cria socket base
             base_socket = self._create_socket()
             
-            # Configura contexto SSL/TLS
-            context = ssl.create_default_context(ssl.Purpose.SERVER_AUTH)
+            # Reutiliza o contexto SSL/TLS para permitir retomada de sessão
+            if context is None:
+                context = self.get_tls_context()
             
-            # Para ambiente de desenvolvimento (aceita certificados auto-assinados)
-            context.check_hostname = False
-            context.verify_mode = ssl.CERT_NONE
-            
-            # Envolve o socket com TLS
+            # Envolve o socket com TLS, oferecendo a sessão anterior (se houver)
             self.socket = context.wrap_socket(
                 base_socket,
-                server_hostname=self.host
+                server_hostname=self.host,
+                session=self._tls_sessions.get(context, {}).get((self.host, self.port))
             )
             
             print(f"[TLS] Conectando a {self.host}:{self.port}...")
@@ -62,6 +94,7 @@ class FileTransferClient:
             print(f"[TLS] Conexão estabelecida com sucesso!")
             print(f"[TLS] Protocolo: {version}")
             print(f"[TLS] Cipher: {cipher[0]}")
+            print(f"[TLS] Sessão retomada: {'sim' if self.socket.session_reused else 'não'}")
             
             return True
         except Exception as e:
@@ -78,50 +111,123 @@ class FileTransferClient:
             print(f"[ERRO] Arquivo não encontrado: {filepath}")
             return False
         
+        # A partir do primeiro byte enviado, uma falha deixa o fluxo fora de
+        # sincronia com o servidor e a conexão precisa ser descartada
+        on_wire = False
         try:
-            # Lê o conteúdo do arquivo
-            with open(filepath, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # Prepara os dados para envio
-            filename = os.path.basename(filepath)
-            filesize = len(content.encode('utf-8'))
-            
-            print(f"\n[INFO] Enviando arquivo: {filename}")
-            print(f"[INFO] Tamanho: {filesize} bytes")
+            with open(filepath, 'rb') as f:
+                # Prepara os dados para envio: o tamanho vem do arquivo aberto,
+                # o mesmo que será enviado (sem ler o conteúdo)
+                filename = os.path.basename(filepath)
+                filesize = os.fstat(f.fileno()).st_size
+                
+                print(f"\n[INFO] Enviando arquivo: {filename}")
+                print(f"[INFO] Tamanho: {filesize} bytes")
+                
+                # Envia metadados (nome e tamanho)
+                header = f"{filename}|{filesize}|".encode('utf-8')
+                
+                # Marca tempo inicial (relógio monotônico de alta resolução)
+                start_ns = time.perf_counter_ns()
+                on_wire = True
+                
+                # Envia header e conteúdo: no TLS o header segue no mesmo
+                # registro do primeiro bloco; no TCP puro header e primeiro
+                # bloco vão em um único sendmsg e o resto via sendfile
+                if isinstance(self.socket, ssl.SSLSocket):
+                    self._send_chunks(f, header, filesize)
+                else:
+                    self._send_plain(f, header, filesize)
+                
+                # Marca tempo final
+                end_ns = time.perf_counter_ns()
             
-            # Envia metadados (nome e tamanho)
-            header = f"{filename}|{filesize}|".encode('utf-8')
-            
-            # Marca tempo inicial
-            start_time = time.time()
-            
-            # Envia header
-            self.socket.sendall(header)
-            
-            # Envia conteúdo
-            self.socket.sendall(content.encode('utf-8'))
-            
-            # Marca tempo final
-            end_time = time.time()
-            
-            # Aguarda confirmação
-            ack = self.socket.recv(1024).decode('utf-8')
+            # Aguarda confirmação (tamanho fixo: a conexão pode seguir com outros arquivos)
+            ack = self._recv_exact(len(self.ACK))
+            if ack != self.ACK:
+                print(f"[ERRO] Confirmação inválida ou conexão encerrada pelo servidor: {ack!r}")
+                self._abort_connection()
+                return False
             
             # Calcula estatísticas
             self.transfer_stats['bytes_sent'] = len(header) + filesize
-            self.transfer_stats['transfer_time'] = end_time - start_time
+            self.transfer_stats['transfer_time'] = (end_ns - start_ns) / 1e9
             
             print(f"[OK] Arquivo enviado com sucesso!")
-            print(f"[INFO] Tempo de transferência: {self.transfer_stats['transfer_time']:.4f}s")
-            print(f"[INFO] Resposta do servidor: {ack}")
+            print(f"[INFO] Tempo de transferência: {self.transfer_stats['transfer_time']:.6f}s")
+            print(f"[INFO] Resposta do servidor: {ack.decode('utf-8')}")
             
             return True
             
         except Exception as e:
             print(f"[ERRO] Falha no envio: {e}")
+            if on_wire:
+                self._abort_connection()
             return False
     
+    def _abort_connection(self):
+        """Descarta uma conexão que ficou fora de sincronia com o servidor"""
+        self.socket.close()
+        self.socket = None
+        print("[INFO] Conexão encerrada após falha no envio.")
+    
+    def _recv_exact(self, size: int) -> bytes:
+        """Recebe exatamente size bytes (menos se a conexão for encerrada)"""
+        data = bytearray(size)
+        view = memoryview(data)
+        received = 0
+        while received < size:
+            n = self.socket.recv_into(view[received:])
+            if not n:
+                break
+            received += n
+        return bytes(view[:received])
+    
+    def _send_chunks(self, f, header: bytes, filesize: int):
+        """Envia header e exatamente filesize bytes do arquivo usando o buffer reutilizável"""
+        view = memoryview(self._scratch)
+        
+        # O header ocupa o início do primeiro bloco (se couber)
+        if len(header) >= len(view):
+            self.socket.sendall(header)
+            header = b""
+        offset = len(header)
+        view[:offset] = header
+        remaining = filesize
+        while offset or remaining:
+            n = f.readinto(view[offset:offset + min(remaining, len(view) - offset)])
+            if remaining and not n:
+                raise IOError("Arquivo diminuiu durante o envio")
+            self.socket.sendall(view[:offset + n])
+            remaining -= n
+            offset = 0
+    
+    def _send_plain(self, f, header: bytes, filesize: int):
+        """Envia header e exatamente filesize bytes por TCP puro com o mínimo de syscalls"""
+        n = f.readinto(memoryview(self._scratch)[:filesize])
+        self._sendmsg_all([header, memoryview(self._scratch)[:n]])
+        
+        # Restante do arquivo com cópia zero (sendfile), limitado ao tamanho anunciado
+        if n < filesize:
+            sent = self.socket.sendfile(f, offset=n, count=filesize - n)
+            if sent != filesize - n:
+                raise IOError("Arquivo diminuiu durante o envio")
+    
+    def _sendmsg_all(self, buffers: list):
+        """Envia vários buffers em uma syscall (scatter-gather), tratando envios parciais"""
+        views = [memoryview(b) for b in buffers if len(b)]
+        if not hasattr(self.socket, 'sendmsg'):
+            # Windows não possui sendmsg
+            self.socket.sendall(b"".join(views))
+            return
+        while views:
+            sent = self.socket.sendmsg(views)
+            while views and sent >= len(views[0]):
+                sent -= len(views[0])
+                views.pop(0)
+            if views:
+                views[0] = views[0][sent:]
+    
     def get_stats(self) -> dict:
         """Retorna estatísticas da transferência"""
         return self.transfer_stats.copy()
@@ -129,6 +235,10 @@ class FileTransferClient:
     def close(self):
         """Fecha a conexão"""
         if self.socket:
+            # Guarda a sessão TLS (tickets do TLS 1.3 chegam após o handshake)
+            if isinstance(self.socket, ssl.SSLSocket) and self.socket.session:
+                sessions = self._tls_sessions.setdefault(self.socket.context, {})
+                sessions[(self.host, self.port)] = self.socket.session
             self.socket.close()
             print("[INFO] Conexão fechada.")
 
@@ -1,47 +1,77 @@
-import time
+import csv
 import statistics
+import sys
+from array import array
+from concurrent.futures import ThreadPoolExecutor
 from typing import List, Dict
 import json
 
+try:
+    import numpy as np
+except ImportError:  # NumPy é opcional: sem ele usa o módulo statistics
+    np = None
+
 
 class PerformanceAnalyzer:
     """Classe para análise de desempenho de transferências TCP vs TLS"""
     
+    # Colunas dos resultados e seus tipos (array.array)
+    COLUMNS = {
+        'bytes_sent': 'q',
+        'transfer_time': 'd',
+        'file_size': 'q',
+        'overhead': 'q',
+        'throughput': 'd'
+    }
+    
     def __init__(self):
-        self.results: Dict[str, List[Dict]] = {
-            'tcp': [],
-            'tls': []
+        # Uma coluna contígua por campo (SoA) em vez de um dict por resultado
+        self.results: Dict[str, Dict[str, array]] = {
+            protocol: {name: array(typecode) for name, typecode in self.COLUMNS.items()}
+            for protocol in ('tcp', 'tls')
         }
     
     def add_result(self, protocol: str, bytes_sent: int, transfer_time: float, 
                    file_size: int, overhead: int = 0):
         """Adiciona resultado de uma transferência"""
-        result = {
-            'bytes_sent': bytes_sent,
-            'transfer_time': transfer_time,
-            'file_size': file_size,
-            'overhead': overhead,
-            'throughput': bytes_sent / transfer_time if transfer_time > 0 else 0
-        }
-        self.results[protocol.lower()].append(result)
+        columns = self.results[protocol.lower()]
+        columns['bytes_sent'].append(bytes_sent)
+        columns['transfer_time'].append(transfer_time)
+        columns['file_size'].append(file_size)
+        columns['overhead'].append(overhead)
+        columns['throughput'].append(bytes_sent / transfer_time if transfer_time > 0 else 0)
     
     def calculate_statistics(self, protocol: str) -> Dict:
         """Calcula estatísticas para um protocolo"""
-        if not self.results[protocol]:
+        columns = self.results[protocol]
+        times = columns['transfer_time']
+        throughputs = columns['throughput']
+        overheads = columns['overhead']
+        
+        if not times:
             return {}
         
-        times = [r['transfer_time'] for r in self.results[protocol]]
-        throughputs = [r['throughput'] for r in self.results[protocol]]
-        overheads = [r['overhead'] for r in self.results[protocol]]
+        if np is not None:
+            # Reduções vetorizadas em C sobre as colunas (sem cópia)
+            times_arr = np.asarray(times)
+            avg_time = float(times_arr.mean())
+            stdev_time = float(times_arr.std(ddof=1)) if len(times) > 1 else 0
+            avg_throughput = float(np.asarray(throughputs).mean())
+            avg_overhead = float(np.asarray(overheads).mean())
+        else:
+            avg_time = statistics.mean(times)
+            stdev_time = statistics.stdev(times) if len(times) > 1 else 0
+            avg_throughput = statistics.mean(throughputs)
+            avg_overhead = statistics.mean(overheads)
         
         return {
             'count': len(times),
-            'avg_time': statistics.mean(times),
+            'avg_time': avg_time,
             'min_time': min(times),
             'max_time': max(times),
-            'stdev_time': statistics.stdev(times) if len(times) > 1 else 0,
-            'avg_throughput': statistics.mean(throughputs),
-            'avg_overhead': statistics.mean(overheads) if overheads else 0
+            'stdev_time': stdev_time,
+            'avg_throughput': avg_throughput,
+            'avg_overhead': avg_overhead
         }
     
     def compare_protocols(self) -> Dict:
@@ -144,24 +174,39 @@ class PerformanceAnalyzer:
     
     def export_csv(self, filename: str = 'performance_data.csv'):
         """Exporta dados para CSV"""
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write("protocol,test_number,bytes_sent,transfer_time,file_size,overhead,throughput\n")
-            
+        def rows():
+            # Linhas geradas diretamente das colunas, sem montar strings por linha
             for protocol in ['tcp', 'tls']:
-                for i, result in enumerate(self.results[protocol], 1):
-                    f.write(f"{protocol},{i},{result['bytes_sent']},"
-                           f"{result['transfer_time']:.6f},{result['file_size']},"
-                           f"{result['overhead']},{result['throughput']:.2f}\n")
+                columns = self.results[protocol]
+                for i, (bytes_sent, transfer_time, file_size, overhead, throughput) in enumerate(
+                        zip(columns['bytes_sent'], columns['transfer_time'],
+                            columns['file_size'], columns['overhead'],
+                            columns['throughput']), 1):
+                    yield (protocol, i, bytes_sent, f"{transfer_time:.6f}",
+                           file_size, overhead, f"{throughput:.2f}")
+        
+        with open(filename, 'w', newline='', encoding='utf-8', buffering=1 << 20) as f:
+            writer = csv.writer(f, lineterminator='\n')
+            writer.writerow(['protocol', 'test_number', 'bytes_sent', 'transfer_time',
+                             'file_size', 'overhead', 'throughput'])
+            writer.writerows(rows())
         
         print(f"Dados exportados para: {filename}")
 
 
 # Exemplo de uso
-def run_performance_tests():
-    """Executa testes de desempenho"""
+def run_performance_tests(num_tests: int = 10, concurrency: int = 1):
+    """Executa testes de desempenho
+    
+    Os envios de cada protocolo são divididos entre `concurrency` conexões
+    simultâneas; com o padrão (1) todos seguem por uma única conexão.
+    """
     from client import FileTransferClient
     import os
     
+    if concurrency < 1:
+        raise ValueError("concurrency deve ser >= 1")
+    
     analyzer = PerformanceAnalyzer()
     
     # Cria arquivo de teste
@@ -170,36 +215,51 @@ def run_performance_tests():
         f.write("Dados de teste para análise de desempenho.\n" * 1000)
     
     file_size = os.path.getsize(test_file)
-    num_tests = 10
     
     print("Iniciando testes de desempenho...")
     print(f"Arquivo de teste: {test_file} ({file_size} bytes)")
-    print(f"Número de testes por protocolo: {num_tests}\n")
+    print(f"Número de testes por protocolo: {num_tests}")
+    print(f"Conexões simultâneas: {concurrency}\n")
+    
+    def run_client(protocol: str, port: int, count: int) -> List[Dict]:
+        """Envia o arquivo `count` vezes por uma única conexão"""
+        client = FileTransferClient(port=port)
+        if protocol == 'tls':
+            connected = client.connect_tls(context=FileTransferClient.get_tls_context())
+        else:
+            connected = client.connect_plain()
+        
+        results = []
+        if connected:
+            for _ in range(count):
+                # Após uma falha a conexão é descartada pelo cliente
+                if not client.send_file(test_file):
+                    break
+                results.append(client.get_stats())
+            client.close()
+        return results
+    
+    def run_protocol(protocol: str, port: int):
+        """Distribui os testes entre conexões executadas em paralelo"""
+        counts = [num_tests // concurrency + (1 if i < num_tests % concurrency else 0)
+                  for i in range(concurrency)]
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            runs = list(executor.map(lambda count: run_client(protocol, port, count),
+                                     [count for count in counts if count]))
+        for results in runs:
+            for stats in results:
+                overhead = stats['bytes_sent'] - file_size if protocol == 'tls' else 0
+                analyzer.add_result(protocol, stats['bytes_sent'],
+                                    stats['transfer_time'], file_size,
+                                    overhead=overhead)
     
     # Testa TCP
     print("Testando TCP...")
-    for i in range(num_tests):
-        client = FileTransferClient(port=5001)
-        if client.connect_plain():
-            client.send_file(test_file)
-            stats = client.get_stats()
-            analyzer.add_result('tcp', stats['bytes_sent'], 
-                              stats['transfer_time'], file_size)
-            client.close()
-        time.sleep(0.1)
+    run_protocol('tcp', 5001)
     
-    # Testa TLS
+    # Testa TLS (o handshake é feito uma vez por conexão)
     print("\nTestando TLS...")
-    for i in range(num_tests):
-        client = FileTransferClient(port=5002)
-        if client.connect_tls():
-            client.send_file(test_file)
-            stats = client.get_stats()
-            analyzer.add_result('tls', stats['bytes_sent'], 
-                              stats['transfer_time'], file_size, 
-                              overhead=stats['bytes_sent'] - file_size)
-            client.close()
-        time.sleep(0.1)
+    run_protocol('tls', 5002)
     
     # Gera relatórios
     print("\n" + "="*70)
@@ -207,5 +267,21 @@ def run_performance_tests():
     analyzer.export_csv()
 
 
+def main():
+    """Função principal: python performance_analyzer.py [num_testes] [conexoes]"""
+    try:
+        num_tests = int(sys.argv[1]) if len(sys.argv) > 1 else 10
+        concurrency = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    except ValueError:
+        print("Uso: python performance_analyzer.py [num_testes] [conexoes]")
+        return
+    
+    if num_tests < 1 or concurrency < 1:
+        print("[ERRO] num_testes e conexoes devem ser >= 1")
+        return
+    
+    run_performance_tests(num_tests=num_tests, concurrency=concurrency)
+
+
 if __name__ == "__main__":
-    run_performance_tests()
\ No newline at end of file
+    main()
\ No newline at end of file
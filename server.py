@@ -1,34 +1,63 @@
+import asyncio
 import socket
 import ssl
 import os
-import threading
-from typing import Optional
+import datetime
+from typing import Dict, Optional, Tuple
+
+try:
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    from cryptography.x509.oid import NameOID
+except ImportError:  # cryptography é opcional: sem ele usa o comando openssl
+    x509 = None
 
 
 class FileTransferServer:
     """Servidor para recepção de arquivos com suporte a TCP e TLS"""
     
+    # Buffers de envio/recepção do socket (>= arquivo de teste)
+    SOCKET_BUFFER_SIZE = 1024 * 1024
+    
+    # Limites dos campos do header (filename|filesize|)
+    MAX_FILENAME_SIZE = 255
+    MAX_FILESIZE_DIGITS = 20
+    MAX_HEADER_SIZE = MAX_FILENAME_SIZE + MAX_FILESIZE_DIGITS + 2
+    
+    # Contextos TLS já carregados, indexados por arquivo e data de modificação
+    _tls_ctx_cache: Dict[Tuple[str, float, str, float], ssl.SSLContext] = {}
+    
     def __init__(self, host: str = '0.0.0.0', port: int = 5000, use_tls: bool = False):
         self.host = host
         self.port = port
         self.use_tls = use_tls
         self.socket: Optional[socket.socket] = None
-        self.running = False
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._stop_event: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
         self.output_dir = "received_files"
         
         # Cria diretório para arquivos recebidos
         os.makedirs(self.output_dir, exist_ok=True)
+        
+        # Contexto TLS único (criado em serve): mantém o cache de sessões
+        # e as chaves de ticket entre conexões
+        self._tls_ctx: Optional[ssl.SSLContext] = None
     
     def _create_socket(self) -> socket.socket:
         """Cria um socket TCP"""
         sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
         sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        # Opções herdadas pelos sockets aceitos: sem Nagle e buffers fixos
+        # (SO_RCVBUF precisa ser definido antes do listen para o window scaling)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, self.SOCKET_BUFFER_SIZE)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.SOCKET_BUFFER_SIZE)
         return sock
     
     def _setup_tls_context(self) -> ssl.SSLContext:
-        """Configura contexto SSL/TLS"""
-        context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
-        
+        """Configura contexto SSL/TLS (compartilhado entre servidores do processo)"""
         # Para desenvolvimento: gera certificado auto-assinado se não existir
         certfile = 'server.crt'
         keyfile = 'server.key'
@@ -37,10 +66,59 @@ class FileTransferServer:
             print("[INFO] Gerando certificado auto-assinado...")
             self._generate_self_signed_cert(certfile, keyfile)
         
-        context.load_cert_chain(certfile=certfile, keyfile=keyfile)
+        # Só decodifica o PEM de novo se algum dos arquivos mudou
+        key = (certfile, os.path.getmtime(certfile), keyfile, os.path.getmtime(keyfile))
+        context = self._tls_ctx_cache.get(key)
+        if context is None:
+            context = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+            context.load_cert_chain(certfile=certfile, keyfile=keyfile)
+            
+            # TLS 1.2: prioriza AES-GCM (AES-NI/CLMUL) sobre ChaCha20 (a ordem do
+            # servidor já prevalece); no TLS 1.3 a ordem padrão começa por AES-GCM
+            context.set_ciphers('ECDHE+AESGCM:ECDHE+CHACHA20')
+            self._tls_ctx_cache[key] = context
         return context
     
     def _generate_self_signed_cert(self, certfile: str, keyfile: str):
+        """Gera certificado auto-assinado no próprio processo (cryptography)"""
+        if x509 is None:
+            self._generate_self_signed_cert_openssl(certfile, keyfile)
+            return
+        
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = x509.Name([
+            x509.NameAttribute(NameOID.COUNTRY_NAME, "BR"),
+            x509.NameAttribute(NameOID.STATE_OR_PROVINCE_NAME, "State"),
+            x509.NameAttribute(NameOID.LOCALITY_NAME, "City"),
+            x509.NameAttribute(NameOID.ORGANIZATION_NAME, "Organization"),
+            x509.NameAttribute(NameOID.COMMON_NAME, "localhost"),
+        ])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = (
+            x509.CertificateBuilder()
+            .subject_name(name)
+            .issuer_name(name)
+            .public_key(key.public_key())
+            .serial_number(x509.random_serial_number())
+            .not_valid_before(now)
+            .not_valid_after(now + datetime.timedelta(days=365))
+            .add_extension(x509.SubjectAlternativeName([x509.DNSName("localhost")]),
+                           critical=False)
+            .sign(key, hashes.SHA256())
+        )
+        
+        # Chave privada legível apenas pelo dono, como faz o openssl
+        key_fd = os.open(keyfile, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with open(key_fd, 'wb') as f:
+            f.write(key.private_bytes(
+                encoding=serialization.Encoding.PEM,
+                format=serialization.PrivateFormat.PKCS8,
+                encryption_algorithm=serialization.NoEncryption()
+            ))
+        with open(certfile, 'wb') as f:
+            f.write(cert.public_bytes(serialization.Encoding.PEM))
+    
+    def _generate_self_signed_cert_openssl(self, certfile: str, keyfile: str):
         """Gera certificado auto-assinado usando OpenSSL"""
         cmd = (f'openssl req -new -x509 -days 365 -nodes -out {certfile} '
                f'-keyout {keyfile} -subj "/C=BR/ST=State/L=City/O=Organization/CN=localhost"')
@@ -53,109 +131,148 @@ class FileTransferServer:
     def start(self):
         """Inicia o servidor"""
         try:
-            # Cria socket base
-            self.socket = self._create_socket()
-            self.socket.bind((self.host, self.port))
-            self.socket.listen(5)
-            self.running = True
-            
-            protocol = "TLS" if self.use_tls else "TCP"
-            print(f"[{protocol}] Servidor iniciado em {self.host}:{self.port}")
-            print(f"[{protocol}] Aguardando conexões...")
-            
-            while self.running:
-                try:
-                    client_socket, address = self.socket.accept()
-                    print(f"\n[{protocol}] Nova conexão de {address[0]}:{address[1]}")
-                    
-                    # Se usar TLS, envolve o socket
-                    if self.use_tls:
-                        context = self._setup_tls_context()
-                        client_socket = context.wrap_socket(
-                            client_socket,
-                            server_side=True
-                        )
-                        print(f"[TLS] Handshake completado - Cipher: {client_socket.cipher()[0]}")
-                    
-                    # Cria thread para lidar com o cliente
-                    client_thread = threading.Thread(
-                        target=self._handle_client,
-                        args=(client_socket, address)
-                    )
-                    client_thread.start()
-                    
-                except KeyboardInterrupt:
-                    print("\n[INFO] Encerrando servidor...")
-                    break
-                except Exception as e:
-                    if self.running:
-                        print(f"[ERRO] Erro ao aceitar conexão: {e}")
-            
+            asyncio.run(self.serve())
+        except KeyboardInterrupt:
+            print("\n[INFO] Encerrando servidor...")
         except Exception as e:
             print(f"[ERRO] Falha ao iniciar servidor: {e}")
         finally:
             self.stop()
     
-    def _handle_client(self, client_socket: socket.socket, address: tuple):
+    async def serve(self):
+        """Atende conexões no event loop atual até o servidor ser parado"""
+        if self.use_tls and self._tls_ctx is None:
+            self._tls_ctx = self._setup_tls_context()
+        
+        # Cria socket base (mantém as opções definidas em _create_socket)
+        self.socket = self._create_socket()
+        self.socket.bind((self.host, self.port))
+        
+        self._loop = asyncio.get_running_loop()
+        self._stop_event = asyncio.Event()
+        # Obs.: falhas de handshake TLS ocorrem no transporte, antes de
+        # _handle_client, e o asyncio não as repassa ao exception handler
+        self._server = await asyncio.start_server(
+            self._handle_client,
+            sock=self.socket,
+            ssl=self._tls_ctx,
+            backlog=5
+        )
+        
+        protocol = "TLS" if self.use_tls else "TCP"
+        print(f"[{protocol}] Servidor iniciado em {self.host}:{self.port}")
+        print(f"[{protocol}] Aguardando conexões...")
+        
+        # Atende até stop(); um cancelamento (Ctrl-C) se propaga normalmente
+        async with self._server:
+            await self._stop_event.wait()
+    
+    async def _handle_client(self, reader: asyncio.StreamReader,
+                             writer: asyncio.StreamWriter):
         """Trata a comunicação com um cliente"""
         protocol = "TLS" if self.use_tls else "TCP"
+        address = writer.get_extra_info('peername')
+        print(f"\n[{protocol}] Nova conexão de {address[0]}:{address[1]}")
+        
+        # No TLS o handshake já foi concluído pelo transporte
+        ssl_object = writer.get_extra_info('ssl_object')
+        if ssl_object is not None:
+            reused = "sim" if ssl_object.session_reused else "não"
+            print(f"[TLS] Handshake completado - Cipher: {ssl_object.cipher()[0]}"
+                  f" - Sessão retomada: {reused}")
         
         try:
-            # Recebe os dados
-            data = b""
-            header_received = False
-            filename = ""
-            filesize = 0
-            
+            # Recebe arquivos em sequência até o cliente encerrar a conexão;
+            # pending guarda bytes lidos além do header (início do conteúdo)
+            pending = bytearray()
             while True:
-                chunk = client_socket.recv(4096)
-                if not chunk:
+                header = await self._read_header(reader, pending)
+                if header is None:
                     break
+                filename, filesize = header
                 
-                data += chunk
+                print(f"[{protocol}] Recebendo: {filename} ({filesize} bytes)")
                 
-                # Processa header na primeira recepção
-                if not header_received and b"|" in data:
-                    # Extrai header (filename|filesize|)
-                    header_end = data.find(b"|", data.find(b"|") + 1) + 1
-                    header = data[:header_end].decode('utf-8')
-                    parts = header.split('|')
-                    
-                    if len(parts) >= 2:
-                        filename = parts[0]
-                        filesize = int(parts[1])
-                        header_received = True
-                        
-                        # Remove header dos dados
-                        data = data[header_end:]
-                        
-                        print(f"[{protocol}] Recebendo: {filename} ({filesize} bytes)")
+                # Parte do conteúdo pode ter chegado junto com o header
+                head = bytes(pending[:filesize])
+                del pending[:filesize]
                 
-                # Verifica se recebeu tudo
-                if header_received and len(data) >= filesize:
-                    break
-            
-            # Salva o arquivo
-            if header_received:
+                # Recebe o conteúdo; se o cliente encerrar antes, salva o que chegou
+                complete = True
+                try:
+                    rest = await reader.readexactly(filesize - len(head))
+                except asyncio.IncompleteReadError as e:
+                    rest = e.partial
+                    complete = False
+                
+                # Salva o arquivo fora do event loop para não bloquear outras conexões
                 filepath = os.path.join(self.output_dir, f"{protocol}_{filename}")
-                with open(filepath, 'wb') as f:
-                    f.write(data[:filesize])
+                await asyncio.get_running_loop().run_in_executor(
+                    None, self._save_file, filepath, head, rest
+                )
                 
                 print(f"[{protocol}] Arquivo salvo: {filepath}")
                 
+                if not complete:
+                    break
+                
                 # Envia confirmação
-                client_socket.sendall(b"ACK: Arquivo recebido com sucesso!")
+                writer.write(b"ACK: Arquivo recebido com sucesso!")
+                await writer.drain()
             
         except Exception as e:
             print(f"[{protocol}] Erro ao processar cliente: {e}")
         finally:
-            client_socket.close()
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
             print(f"[{protocol}] Conexão encerrada com {address[0]}:{address[1]}")
     
+    async def _read_header(self, reader: asyncio.StreamReader,
+                           pending: bytearray) -> Optional[Tuple[str, int]]:
+        """Lê o header (filename|filesize|) sem ler mais que MAX_HEADER_SIZE bytes
+        
+        Retorna None se a conexão terminar antes de um header completo.
+        """
+        while True:
+            # Busca restrita aos primeiros bytes de cada campo
+            sep1 = pending.find(b"|", 0, self.MAX_FILENAME_SIZE + 1)
+            if sep1 == -1:
+                if len(pending) > self.MAX_FILENAME_SIZE:
+                    raise ValueError(f"Header inválido: nome maior que {self.MAX_FILENAME_SIZE} bytes")
+            else:
+                sep2 = pending.find(b"|", sep1 + 1, sep1 + self.MAX_FILESIZE_DIGITS + 2)
+                if sep2 != -1:
+                    size_field = bytes(pending[sep1 + 1:sep2])
+                    if not size_field.isdigit():
+                        raise ValueError("Header inválido: tamanho não numérico")
+                    filename = pending[:sep1].decode('utf-8')
+                    del pending[:sep2 + 1]
+                    return filename, int(size_field)
+                if len(pending) > sep1 + self.MAX_FILESIZE_DIGITS + 1:
+                    raise ValueError(f"Header inválido: tamanho com mais de "
+                                     f"{self.MAX_FILESIZE_DIGITS} dígitos")
+            
+            chunk = await reader.read(self.MAX_HEADER_SIZE - len(pending))
+            if not chunk:
+                return None
+            pending += chunk
+    
+    @staticmethod
+    def _save_file(filepath: str, *parts: bytes):
+        """Grava o conteúdo recebido em disco (executado em thread do executor)"""
+        with open(filepath, 'wb') as f:
+            for part in parts:
+                f.write(part)
+    
     def stop(self):
         """Para o servidor"""
-        self.running = False
-        if self.socket:
+        if self._stop_event and self._loop and not self._loop.is_closed():
+            # Pode ser chamado de outra thread: sinaliza no loop do servidor
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+        elif self.socket:
             self.socket.close()
 
 
@@ -171,6 +288,34 @@ def start_tls_server():
     server.start()
 
 
+def start_both_servers():
+    """Inicia os servidores TCP (5001) e TLS (5002) no mesmo event loop"""
+    servers = [
+        FileTransferServer(port=5001, use_tls=False),
+        FileTransferServer(port=5002, use_tls=True)
+    ]
+    
+    async def serve(server: FileTransferServer):
+        # Falha de um servidor (ex.: certificado ausente) não derruba o outro
+        try:
+            await server.serve()
+        except Exception as e:
+            print(f"[ERRO] Falha ao iniciar servidor: {e}")
+    
+    async def serve_all():
+        await asyncio.gather(*(serve(server) for server in servers))
+    
+    try:
+        asyncio.run(serve_all())
+    except KeyboardInterrupt:
+        print("\n[INFO] Encerrando servidores...")
+    except Exception as e:
+        print(f"[ERRO] Falha ao iniciar servidores: {e}")
+    finally:
+        for server in servers:
+            server.stop()
+
+
 def main():
     """Função principal - inicia ambos os servidores"""
     print("="*60)
@@ -188,17 +333,7 @@ def main():
     elif choice == "2":
         start_tls_server()
     elif choice == "3":
-        # Inicia servidor TCP em thread separada
-        tcp_thread = threading.Thread(target=start_tcp_server)
-        tcp_thread.daemon = True
-        tcp_thread.start()
-        
-        # Pequena pausa para garantir que TCP inicie primeiro
-        import time
-        time.sleep(1)
-        
-        # Inicia servidor TLS na thread principal
-        start_tls_server()
+        start_both_servers()
     else:
         print("Opção inválida!")
 